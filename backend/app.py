@@ -1,5 +1,5 @@
 import os
-import json
+import sys
 import asyncio
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -8,19 +8,19 @@ from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, FileResponse
 import openai
 from dotenv import load_dotenv
-import base64
-import tempfile
-import os
 import uvicorn
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Set
 from pydantic import BaseModel
-import json
-from gtts import gTTS
+import orjson
 
-# Load environment variables
+# Load environment variables (before the shared core reads its settings)
 load_dotenv()
 
+# Make the shared mindmate package importable when run from the backend directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from mindmate import core
+
 # Initialize FastAPI
 app = FastAPI()
 
@@ -53,68 +53,126 @@ openai.api_key = OPENAI_API_KEY
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
-        self.active_connections = []
+        self.active_connections: Set[WebSocket] = set()
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
 
     async def send_message(self, message: str, websocket: WebSocket):
         await websocket.send_text(message)
 
+    async def send_json(self, payload: dict, websocket: WebSocket):
+        # orjson is much faster than the stdlib json used by WebSocket.send_json
+        await websocket.send_text(orjson.dumps(payload).decode('utf-8'))
+
 manager = ConnectionManager()
 
 # Text-to-speech function
-async def text_to_speech(text: str):
-    """Convert text to speech and return base64 encoded audio"""
+async def text_to_speech(text: str) -> Optional[bytes]:
+    """Convert text to speech and return the encoded audio"""
     try:
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as fp:
-            tts = gTTS(text=text, lang='en')
-            tts.save(fp.name)
-            
-            # Read the file and convert to base64
-            with open(fp.name, 'rb') as audio_file:
-                audio_data = audio_file.read()
-                return base64.b64encode(audio_data).decode('utf-8')
+        return await core.tts(text)
     except Exception as e:
         print(f"Error in text_to_speech: {str(e)}")
         return None
 
+FALLBACK_RESPONSE = "Hmm, I'm having trouble thinking of a response right now. Could we try that again?"
+
 # Process text with OpenAI
 async def process_text_with_openai(text: str):
     """Process text using OpenAI's API with a friendly, human-like personality"""
     try:
-        response = await openai.ChatCompletion.acreate(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": """You are a friendly, supportive, and empathetic friend named MindMate. 
-                    Your personality is warm, understanding, and always positive. You never mention being an AI or chatbot. 
-                    Instead, you're just a good friend who's always there to listen and help. 
-                    Keep your responses natural, casual, and conversational. Use casual language, occasional emojis, 
-                    and show genuine interest in the conversation. Be concise but thoughtful in your responses.
-                    
-                    Guidelines:
-                    - Never mention you're an AI, assistant, or bot
-                    - Don't discuss your system settings or how you work
-                    - Keep responses friendly and natural, like a close friend
-                    - Show empathy and understanding
-                    - Use casual language and occasional emojis when appropriate
-                    - Be concise but thoughtful in your responses"""
-                },
-                {"role": "user", "content": text}
-            ],
-            temperature=0.8,  # Slightly more creative responses
-            max_tokens=200    # Keep responses concise
-        )
-        return response.choices[0].message['content']
+        return await core.chat(text)
     except Exception as e:
         print(f"Error in process_text_with_openai: {str(e)}")
-        return "Hmm, I'm having trouble thinking of a response right now. Could we try that again?"
+        return FALLBACK_RESPONSE
+
+async def stream_text_with_openai(text: str):
+    """Like process_text_with_openai, but yield the response sentence by sentence as it streams in
+
+    If the stream fails, even partway through, the fallback response is
+    yielded so a cut-off reply isn't presented as complete.
+    """
+    try:
+        async for sentence in core.chat_stream(text):
+            yield sentence
+    except Exception as e:
+        print(f"Error in stream_text_with_openai: {str(e)}")
+        yield FALLBACK_RESPONSE
+
+async def stream_reply(websocket: WebSocket, user_text: str, response_type: str):
+    """Stream a spoken reply to the client one sentence at a time
+
+    Speech for each sentence is synthesized as soon as the sentence is
+    complete, while the rest of the response is still being generated.
+    Every sentence is sent in order as an "audio_chunk" JSON message,
+    followed by a binary frame with its audio when has_audio is set. A
+    final response_type message carries the full text.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for sentence in stream_text_with_openai(user_text):
+                await queue.put((sentence, asyncio.ensure_future(text_to_speech(sentence))))
+        finally:
+            await queue.put(None)
+
+    producer = asyncio.ensure_future(produce())
+    sentences = []
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            sentence, speech = item
+            sentences.append(sentence)
+            audio_data = await speech
+            await manager.send_json({
+                "type": "audio_chunk",
+                "text": sentence,
+                "has_audio": audio_data is not None,
+                "mime": core.speech_mime(audio_data) if audio_data is not None else None
+            }, websocket)
+            if audio_data is not None:
+                await websocket.send_bytes(audio_data)
+        await producer
+    finally:
+        if not producer.done():
+            producer.cancel()
+        while not queue.empty():
+            item = queue.get_nowait()
+            if item is not None:
+                item[1].cancel()
+
+    await manager.send_json({
+        "type": response_type,
+        "text": " ".join(sentences)
+    }, websocket)
+
+# Fixed phrases whose speech is synthesized at startup and pinned in memory
+CANNED_PHRASES = [FALLBACK_RESPONSE]
+
+@app.on_event("startup")
+async def start_canned_speech_preload():
+    # Runs in the background so startup isn't held up by TTS round-trips;
+    # the task is kept on app.state so it isn't garbage-collected mid-run
+    app.state.speech_preload = asyncio.ensure_future(core.preload_speech(CANNED_PHRASES))
+
+@app.on_event("shutdown")
+async def close_core():
+    await core.close()
+
+# Largest recorded audio accepted over the websocket. The server's websocket
+# frame limit must sit above it, or oversized uploads are dropped with close
+# code 1009 before they can be rejected here; start commands that pass
+# --ws-max-size need raising along with MAX_AUDIO_BYTES.
+MAX_AUDIO_BYTES = int(os.getenv("MAX_AUDIO_BYTES", "10000000"))
+WS_MAX_SIZE = MAX_AUDIO_BYTES + 2_000_000
 
 # WebSocket endpoint for real-time communication
 @app.websocket("/ws")
@@ -122,76 +180,56 @@ async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
-            # Receive data from the client
-            data = await websocket.receive_text()
-            data = json.loads(data)
+            # Receive data from the client: binary frames carry recorded audio,
+            # text frames carry JSON messages
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
             
-            if data.get("type") == "audio":
+            audio_bytes = message.get("bytes")
+            if audio_bytes is not None:
                 # Process audio data using OpenAI's Whisper API
-                audio_base64 = data.get("audio")
-                if not audio_base64:
-                    await websocket.send_json({
+                if not audio_bytes:
+                    await manager.send_json({
                         "type": "error",
                         "text": "No audio data received"
-                    })
+                    }, websocket)
+                    continue
+                if len(audio_bytes) > MAX_AUDIO_BYTES:
+                    await manager.send_json({
+                        "type": "error",
+                        "text": "Audio message is too large"
+                    }, websocket)
                     continue
                 
                 try:
-                    # Save the audio to a temporary file
-                    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as audio_file:
-                        audio_file.write(base64.b64decode(audio_base64))
-                        audio_path = audio_file.name
-                    
                     # Transcribe audio using OpenAI's Whisper API
-                    with open(audio_path, "rb") as audio_file:
-                        transcript = await openai.Audio.atranscribe(
-                            "whisper-1",
-                            audio_file
-                        )
+                    user_text = await core.transcribe(audio_bytes)
                     
-                    user_text = transcript["text"]
-                    
-                    # Get response from OpenAI
-                    response_text = await process_text_with_openai(user_text)
-                    
-                    # Convert response to speech
-                    audio_data = await text_to_speech(response_text)
-                    
-                    # Send the response back to the client
-                    await websocket.send_json({
-                        "type": "audio_response",
-                        "text": response_text,
-                        "audio": audio_data
-                    })
+                    # Stream the spoken response back to the client
+                    await stream_reply(websocket, user_text, "audio_response")
                     
                 except Exception as e:
                     print(f"Error processing audio: {str(e)}")
-                    await websocket.send_json({
+                    await manager.send_json({
                         "type": "error",
                         "text": f"Error processing audio: {str(e)}"
-                    })
-                
-            elif data.get("type") == "text":
+                    }, websocket)
+                continue
+            
+            data = orjson.loads(message["text"])
+            if data.get("type") == "text":
                 # Process text input
                 user_text = data.get("text", "")
                 
-                # Get response from OpenAI
-                response_text = await process_text_with_openai(user_text)
-                
-                # Convert response to speech
-                audio_data = await text_to_speech(response_text)
-                
-                # Send the response back to the client
-                await websocket.send_json({
-                    "type": "text_response",
-                    "text": response_text,
-                    "audio": audio_data
-                })
+                # Stream the spoken response back to the client
+                await stream_reply(websocket, user_text, "text_response")
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
         print(f"WebSocket error: {str(e)}")
+        manager.disconnect(websocket)
         await websocket.close()
 
 # API endpoint for text-based interaction
@@ -227,4 +265,14 @@ async def health_check():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
+    # uvloop has no Windows build; fall back to the stdlib event loop there
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        ws="websockets",
+        workers=int(os.getenv("WEB_CONCURRENCY", "2")),
+        ws_max_size=WS_MAX_SIZE
+    )
@@ -11,6 +11,10 @@ let socket;
 let mediaRecorder;
 let audioChunks = [];
 let isRecording = false;
+let audioQueue = [];
+let isPlaying = false;
+let streamingMessage = null;
+let pendingAudioMime = null;
 
 // Initialize
 function init() {
@@ -31,6 +35,9 @@ function setupEventListeners() {
     userInput.addEventListener('keypress', (e) => {
         if (e.key === 'Enter') sendTextMessage();
     });
+    
+    // Play queued audio chunks back to back
+    audioPlayer.addEventListener('ended', playNextAudio);
 }
 
 // WebSocket Connection
@@ -41,13 +48,18 @@ function connectWebSocket() {
         : 'wss://mindmate-motivation.onrender.com/ws';
     
     socket = new WebSocket(wsUrl);
+    socket.binaryType = 'arraybuffer';
     
     socket.onopen = () => updateStatus('Connected');
     socket.onclose = () => {
         updateStatus('Disconnected. Reconnecting...', 'error');
         setTimeout(connectWebSocket, 3000);
     };
-    socket.onmessage = (e) => handleServerMessage(JSON.parse(e.data));
+    socket.onmessage = (e) => {
+        // Text frames are JSON messages; binary frames are the audio for the preceding chunk
+        if (typeof e.data === 'string') handleServerMessage(JSON.parse(e.data));
+        else handleAudioFrame(e.data);
+    };
     socket.onerror = (e) => {
         console.error('WebSocket error:', e);
         updateStatus('Connection error', 'error');
@@ -56,10 +68,31 @@ function connectWebSocket() {
 
 // Handle Server Messages
 function handleServerMessage(data) {
-    if (data.text) {
-        addMessage(data.text, 'bot');
-        if (data.audio) playAudio(data.audio);
+    if (data.type === 'audio_chunk') {
+        // Streamed sentence: grow the current bot message and queue its audio
+        if (!streamingMessage) {
+            streamingMessage = addMessage(data.text, 'bot');
+        } else {
+            streamingMessage.querySelector('.message-content').textContent += ` ${data.text}`;
+        }
+        pendingAudioMime = data.has_audio ? data.mime : null;
+        return;
+    }
+    
+    if (streamingMessage) {
+        // Final message of a streamed reply
+        if (data.text) streamingMessage.querySelector('.message-content').textContent = data.text;
+        streamingMessage = null;
+        return;
     }
+    
+    if (data.text) addMessage(data.text, 'bot');
+}
+
+function handleAudioFrame(buffer) {
+    if (!pendingAudioMime) return;
+    playAudio(new Blob([buffer], { type: pendingAudioMime }));
+    pendingAudioMime = null;
 }
 
 // Audio Recording
@@ -98,16 +131,10 @@ function stopRecording() {
 function sendAudioMessage() {
     if (audioChunks.length === 0) return;
     
+    // Sent as a raw binary frame
     const audioBlob = new Blob(audioChunks, { type: 'audio/wav' });
-    const reader = new FileReader();
-    
-    reader.onload = () => {
-        const base64Audio = reader.result.split(',')[1];
-        socket?.send(JSON.stringify({ type: 'audio', audio: base64Audio }));
-        addMessage('🎤 [Voice message]', 'user');
-    };
-    
-    reader.readAsDataURL(audioBlob);
+    socket?.send(audioBlob);
+    addMessage('🎤 [Voice message]', 'user');
 }
 
 function sendTextMessage() {
@@ -126,11 +153,27 @@ function addMessage(text, sender) {
     message.innerHTML = `<div class="message-content">${text}</div>`;
     chatMessages.appendChild(message);
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    return message;
 }
 
-function playAudio(base64Audio) {
-    audioPlayer.src = `data:audio/mp3;base64,${base64Audio}`;
-    audioPlayer.play().catch(e => console.error('Audio play failed:', e));
+function playAudio(audioBlob) {
+    audioQueue.push(URL.createObjectURL(audioBlob));
+    if (!isPlaying) playNextAudio();
+}
+
+function playNextAudio() {
+    if (audioPlayer.src.startsWith('blob:')) URL.revokeObjectURL(audioPlayer.src);
+    const src = audioQueue.shift();
+    if (!src) {
+        isPlaying = false;
+        return;
+    }
+    isPlaying = true;
+    audioPlayer.src = src;
+    audioPlayer.play().catch(e => {
+        console.error('Audio play failed:', e);
+        playNextAudio();
+    });
 }
 
 function updateStatus(message, type = '') {
@@ -1,3 +1,4 @@
+import io
 import os
 import sys
 import time
@@ -6,12 +7,13 @@ import threading
 import tempfile
 import subprocess
 import atexit
+from collections import OrderedDict
 from dotenv import load_dotenv
 import speech_recognition as sr
-from gtts import gTTS
 import soundfile as sf
 import sounddevice as sd
 import openai
+from mindmate import core
 
 # Global flag for graceful shutdown
 shutdown_flag = False
@@ -49,6 +51,28 @@ def initialize_tts():
         print(f"❌ Error initializing TTS: {str(e)}")
         return False
 
+# Ambient noise calibration is reused between listens instead of re-measured every time
+CALIBRATION_MAX_AGE = 300  # Seconds before ambient noise is measured again
+RECALIBRATE_AFTER_FAILURES = 2  # Consecutive failed listens that force a new measurement
+_calibrated_threshold = None
+_calibrated_at = 0.0
+_failed_listens = 0
+
+def record_listen_result(success):
+    """Track consecutive failed listens, dropping the calibration after repeated failures
+    
+    Args:
+        success (bool): Whether speech was captured and recognized
+    """
+    global _calibrated_threshold, _failed_listens
+    if success:
+        _failed_listens = 0
+        return
+    _failed_listens += 1
+    if _failed_listens >= RECALIBRATE_AFTER_FAILURES:
+        _calibrated_threshold = None
+        _failed_listens = 0
+
 def get_audio_input(source, recognizer, timeout=5, phrase_time_limit=5):
     """Helper function to get audio input with error handling
     
@@ -61,11 +85,17 @@ def get_audio_input(source, recognizer, timeout=5, phrase_time_limit=5):
     Returns:
         AudioData or None: Captured audio or None if failed
     """
+    global _calibrated_threshold, _calibrated_at
     try:
-        print("🔊 Adjusting for ambient noise...")
-        start_time = time.time()
-        recognizer.adjust_for_ambient_noise(source, duration=min(1.0, timeout/2))
-        print(f"✅ Adjusted for ambient noise in {time.time() - start_time:.1f}s")
+        if _calibrated_threshold is not None and time.time() - _calibrated_at < CALIBRATION_MAX_AGE:
+            recognizer.energy_threshold = _calibrated_threshold
+        else:
+            print("🔊 Adjusting for ambient noise...")
+            start_time = time.time()
+            recognizer.adjust_for_ambient_noise(source, duration=min(1.0, timeout/2))
+            _calibrated_threshold = recognizer.energy_threshold
+            _calibrated_at = time.time()
+            print(f"✅ Adjusted for ambient noise in {time.time() - start_time:.1f}s")
         
         print("🎤 Listening...")
         audio = recognizer.listen(
@@ -83,6 +113,17 @@ def get_audio_input(source, recognizer, timeout=5, phrase_time_limit=5):
         print(f"❌ Error capturing audio: {str(e)}")
         return None
 
+def transcribe_audio(audio):
+    """Transcribe captured audio with OpenAI's Whisper API
+    
+    Args:
+        audio: AudioData captured from the microphone
+        
+    Returns:
+        str: The transcribed text
+    """
+    return core.run_sync(core.transcribe(audio.get_wav_data()))
+
 def listen_to_speech(max_attempts=3, initial_timeout=5):
     """Listen to user's speech and convert to text with improved error handling
     
@@ -119,6 +160,7 @@ def listen_to_speech(max_attempts=3, initial_timeout=5):
                 # Get audio input
                 audio = get_audio_input(source, recognizer, timeout=timeout)
                 if audio is None:
+                    record_listen_result(False)
                     attempts += 1
                     timeout = min(timeout * 1.5, 10)  # Increase timeout up to 10s
                     continue
@@ -127,18 +169,17 @@ def listen_to_speech(max_attempts=3, initial_timeout=5):
                     # Convert speech to text
                     print("🔄 Converting speech to text...")
                     start_time = time.time()
-                    text = recognizer.recognize_google(audio)
+                    text = transcribe_audio(audio)
                     print(f"✅ Speech recognized in {time.time() - start_time:.1f}s")
                     
                     if text and text.strip():
                         print(f"\n🗣️ You said: {text}")
+                        record_listen_result(True)
                         return text.strip()
                     
                     print("❌ Empty speech detected")
                     
-                except sr.UnknownValueError:
-                    print("😕 Could not understand audio")
-                except sr.RequestError as e:
+                except openai.error.OpenAIError as e:
                     print(f"❌ Speech recognition service error: {str(e)}")
                     return None
                 except Exception as e:
@@ -151,6 +192,7 @@ def listen_to_speech(max_attempts=3, initial_timeout=5):
         except Exception as e:
             print(f"❌ Unexpected error in listen_to_speech: {str(e)}")
         
+        record_listen_result(False)
         attempts += 1
         if attempts < max_attempts:
             wait_time = min(timeout, 5)  # Max 5 seconds wait between attempts
@@ -169,31 +211,77 @@ def cleanup_temp_file(file_path):
     except Exception as e:
         print(f"⚠️  Warning: Could not remove temporary file {file_path}: {str(e)}")
 
-def sanitize_text(text, max_length=500):
-    """Sanitize and truncate text for TTS
+# Decoded speech cache so repeated phrases skip synthesis entirely
+SPEECH_CACHE_SIZE = 256
+_speech_cache = OrderedDict()
+_speech_cache_lock = threading.Lock()
+
+# Fixed phrases the assistant speaks; their audio is synthesized once at startup
+# and pinned in the shared speech cache so it is never evicted. The greeting
+# comes last because it is spoken (and cached) immediately while the rest are
+# still loading.
+CANNED_PHRASES = [
+    "I didn't catch that. Please try again.",
+    "I didn't catch that. Could you please repeat?",
+    "Goodbye! Have a great day!",
+    "Goodbye!",
+    "I'm sorry, I couldn't generate a response. Please try again.",
+    "I'm having trouble understanding you. Please check your microphone and try again.",
+    "I encountered an error. Let's try that again.",
+    "I'm having too many issues. Please restart me.",
+    "I'm getting too many requests. Please try again later.",
+    "I'm having trouble connecting to the service. Please try again later.",
+    "I'm sorry, I encountered an error processing your request. Please try again later.",
+    "I'm having trouble processing your request. Please try again later.",
+    "Hello! I'm your MindMate assistant. How can I help you today?",
+]
+
+def synthesize_speech(text):
+    """Synthesize text with the shared TTS engine and decode it
     
     Args:
-        text (str): Input text to sanitize
-        max_length (int): Maximum allowed length of text
+        text (str): Sanitized text to synthesize
         
     Returns:
-        str: Sanitized and truncated text
+        tuple: (data, fs) decoded samples and sample rate
     """
-    if not text or not isinstance(text, str):
-        return ""
+    print(f"🔊 Converting text to speech (length: {len(text)} chars)...")
+    audio_data = core.run_sync(core.tts(text))
     
-    # Remove any non-printable characters and control characters
-    sanitized = "".join(c for c in text if c.isprintable() or c.isspace())
-    sanitized = sanitized.strip()
+    # Decode straight from memory; float32 halves the size of the samples
+    # kept in the cache and streamed to the audio device
+    return sf.read(io.BytesIO(audio_data), dtype='float32')
+
+def load_speech(text):
+    """Return decoded speech for text, reusing cached audio when possible
     
-    # Truncate if too long
-    if len(sanitized) > max_length:
-        sanitized = sanitized[:max_length].rsplit(' ', 1)[0] + "..."
+    Args:
+        text (str): Sanitized text to synthesize
+        
+    Returns:
+        tuple: (data, fs) decoded samples and sample rate
+    """
+    key = core.speech_key(text)
+    with _speech_cache_lock:
+        cached = _speech_cache.get(key)
+        if cached is not None:
+            _speech_cache.move_to_end(key)
+            return cached
     
-    return sanitized
+    speech = synthesize_speech(text)
+    
+    with _speech_cache_lock:
+        _speech_cache[key] = speech
+        if len(_speech_cache) > SPEECH_CACHE_SIZE:
+            _speech_cache.popitem(last=False)
+    return speech
+
+def preload_canned_speech():
+    """Synthesize and pin the audio for every canned phrase"""
+    core.run_sync(core.preload_speech([core.sanitize_text(phrase) for phrase in CANNED_PHRASES]))
 
 def speak_text(text, rate=1.0, volume=1.0):
-    """Convert text to speech using gTTS with improved error handling
+    """Speak text through the shared TTS engine with improved error handling
     
     Args:
         text (str): The text to be spoken
@@ -204,7 +292,7 @@ def speak_text(text, rate=1.0, volume=1.0):
         bool: True if successful, False otherwise
     """
     # Validate and sanitize input
-    sanitized_text = sanitize_text(text)
+    sanitized_text = core.sanitize_text(text)
     if not sanitized_text:
         print("⚠️  No valid text to speak")
         return False
@@ -217,32 +305,14 @@ def speak_text(text, rate=1.0, volume=1.0):
     success = False
     
     try:
-        # Create a temporary file with a unique name
-        temp_file = tempfile.mktemp(suffix='.mp3')
-        
-        # Convert text to speech
-        print(f"🔊 Converting text to speech (length: {len(sanitized_text)} chars)...")
-        tts = gTTS(
-            text=sanitized_text,
-            lang='en',
-            slow=False,
-            lang_check=True
-        )
-        
-        # Save to temp file
-        tts.save(temp_file)
-        
-        if not os.path.exists(temp_file) or os.path.getsize(temp_file) == 0:
-            raise IOError("Failed to generate speech file")
+        data, fs = load_speech(sanitized_text)
         
-        # Load audio file
-        print(f"▶️  Playing audio...")
-        data, fs = sf.read(temp_file)
-        
-        # Apply volume
+        # Apply volume (allocates a new array, leaving the cached audio untouched)
         if volume != 1.0:
             data = data * volume
         
+        print(f"▶️  Playing audio...")
+        
         # Play audio with error handling
         try:
             # Try playing with sounddevice first
@@ -255,6 +325,8 @@ def speak_text(text, rate=1.0, volume=1.0):
             
             # Fallback: Use system default player
             try:
+                temp_file = tempfile.mktemp(suffix='.wav')
+                sf.write(temp_file, data, fs)
                 if sys.platform == 'win32':
                     os.startfile(temp_file)
                 elif sys.platform == 'darwin':  # macOS
@@ -305,6 +377,14 @@ def validate_input(text, max_length=1000):
         
     return True, text
 
+# General-purpose assistant persona for the voice CLI
+ASSISTANT = core.ChatProfile(
+    "You are a helpful assistant.",
+    model="gpt-3.5-turbo",
+    temperature=0.7,
+    max_tokens=500
+)
+
 def process_text(text, max_retries=3, initial_delay=1):
     """Process the recognized text and generate a response with retry logic
     
@@ -327,20 +407,7 @@ def process_text(text, max_retries=3, initial_delay=1):
     
     while retry_count < max_retries and not shutdown_flag:
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": text}
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
-            
-            if not response.choices:
-                raise ValueError("No response from the model")
-                
-            return response.choices[0].message['content'].strip()
+            return core.run_sync(core.chat(text, ASSISTANT)).strip()
             
         except openai.error.RateLimitError as e:
             retry_count += 1
@@ -400,6 +467,9 @@ def main():
         print("❌ Failed to initialize TTS engine. Exiting...")
         return
     
+    # Synthesize canned phrases in the background
+    threading.Thread(target=preload_canned_speech, daemon=True).start()
+    
     # Initial greeting
     print("\n" + "="*50)
     print("✨ MindMate is ready!")
@@ -481,6 +551,7 @@ def main():
     print("\n" + "="*50)
     print("👋 MindMate is shutting down. Goodbye!")
     print("="*50)
+    core.run_sync(core.close())
 
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+"""Shared chat, speech and caching code for the MindMate web app and CLI"""
@@ -0,0 +1,586 @@
+"""Chat, speech and caching shared by the web backend and the CLI
+
+Everything here is process-wide: one set of response and speech caches,
+one keep-alive HTTP session for OpenAI, one TTS thread pool and one Piper
+voice serve every caller. The public API is async; synchronous callers
+(the CLI) go through run_sync, which runs coroutines on a background
+event loop.
+"""
+import os
+import re
+import io
+import wave
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+import numpy as np
+import openai
+from dotenv import load_dotenv
+from gtts import gTTS
+
+# Configuration below is read from the environment at import time
+load_dotenv()
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+CACHE_DIR = ROOT_DIR / ".cache"
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+# Shared keep-alive HTTP session for OpenAI calls, so TLS connections are reused
+HTTP_MAX_CONNECTIONS = 64
+HTTP_MAX_CONNECTIONS_PER_HOST = 32
+HTTP_KEEPALIVE_TIMEOUT = 30  # seconds
+_http_session: Optional[aiohttp.ClientSession] = None
+
+def use_shared_http_session():
+    """Route OpenAI calls made from the current task (and tasks it spawns) through the shared session
+
+    The session is created on first use, so this must be called from a
+    coroutine running on the event loop that will own it.
+    """
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=HTTP_MAX_CONNECTIONS,
+                limit_per_host=HTTP_MAX_CONNECTIONS_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT
+            )
+        )
+    openai.aiosession.set(_http_session)
+
+async def close():
+    """Release the HTTP session and the TTS thread pool"""
+    if _http_session is not None:
+        await _http_session.close()
+    _tts_pool.shutdown(wait=False)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def run_sync(coro):
+    """Run a coroutine from synchronous code and return its result
+
+    All synchronous callers share one background event loop, so the HTTP
+    session and caches are reused across calls.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="mindmate-core", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+# In-memory LRU cache of chat responses, keyed by a digest of the request
+RESPONSE_CACHE_SIZE = 512
+# Sampled (temperature > 0) responses are only cached when explicitly allowed
+CACHE_SAMPLED_RESPONSES = _env_flag("CACHE_SAMPLED_RESPONSES", "false")
+_response_cache: "OrderedDict[bytes, str]" = OrderedDict()
+
+# Persistent response cache shared across restarts and worker processes
+RESPONSE_CACHE_DB = Path(os.getenv("RESPONSE_CACHE_DB", str(CACHE_DIR / "responses.db")))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds
+# Expired rows are deleted when the database is opened and every this many writes
+RESPONSE_DB_PRUNE_EVERY = 256
+_response_db: Optional[sqlite3.Connection] = None
+_response_db_lock = threading.Lock()
+_response_db_writes = 0
+
+# Semantic cache: reuse responses for paraphrased prompts ("I'm sad" / "feeling down").
+# Opt-in: opposite statements ("I want to live" / "I don't want to live") can
+# clear the threshold, and every cache miss pays an extra embeddings call.
+SEMANTIC_CACHE_ENABLED = _env_flag("SEMANTIC_CACHE_ENABLED", "false")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "2048"))
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_CACHE_SIZE = 512
+_embedding_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+class SemanticCache:
+    """Nearest-neighbour lookup of cached responses by cosine similarity
+
+    Vectors are L2-normalized and kept in a fixed-size ring buffer, so a
+    lookup is a single matrix-vector product and the oldest entry is
+    overwritten once the cache is full.
+    """
+    def __init__(self, threshold: float, max_entries: int):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors: Optional[np.ndarray] = None
+        self._responses = []
+        self._next = 0
+
+    def lookup(self, vector: np.ndarray) -> Optional[str]:
+        if not self._responses:
+            return None
+        scores = self._vectors[:len(self._responses)] @ vector
+        best = int(np.argmax(scores))
+        if scores[best] >= self.threshold:
+            return self._responses[best]
+        return None
+
+    def add(self, vector: np.ndarray, response_text: str):
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+        self._vectors[self._next] = vector
+        if len(self._responses) < self.max_entries:
+            self._responses.append(response_text)
+        else:
+            self._responses[self._next] = response_text
+        self._next = (self._next + 1) % self.max_entries
+
+class ChatProfile:
+    """Model settings and system prompt for one assistant persona
+
+    The static parts of every request (the system message and the
+    cache-key prefix) are built once here. Each profile has its own
+    semantic cache, since a reply is only a valid paraphrase hit for the
+    prompt it was generated under.
+    """
+    def __init__(self, system_prompt: str, model: str = "gpt-3.5-turbo",
+                 temperature: float = 0.8, max_tokens: int = 200):
+        self.system_prompt = system_prompt
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.system_message = {"role": "system", "content": system_prompt}
+        self._key_prefix = hashlib.blake2b(
+            "\x1f".join((model, system_prompt, str(temperature), str(max_tokens), "")).encode("utf-8"),
+            digest_size=16
+        )
+        self.semantic_cache = SemanticCache(SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE)
+
+    @property
+    def caching_enabled(self) -> bool:
+        return self.temperature == 0 or CACHE_SAMPLED_RESPONSES
+
+    def cache_key(self, text: str) -> bytes:
+        """Digest of everything that determines a chat completion"""
+        digest = self._key_prefix.copy()
+        digest.update(text.encode("utf-8"))
+        return digest.digest()
+
+    def messages(self, text: str):
+        return [self.system_message, {"role": "user", "content": text}]
+
+    def completion_kwargs(self, text: str) -> dict:
+        return {
+            "model": self.model,
+            "messages": self.messages(text),
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens
+        }
+
+MINDMATE_PROMPT = """You are a friendly, supportive, and empathetic friend named MindMate. 
+                    Your personality is warm, understanding, and always positive. You never mention being an AI or chatbot. 
+                    Instead, you're just a good friend who's always there to listen and help. 
+                    Keep your responses natural, casual, and conversational. Use casual language, occasional emojis, 
+                    and show genuine interest in the conversation. Be concise but thoughtful in your responses.
+                    
+                    Guidelines:
+                    - Never mention you're an AI, assistant, or bot
+                    - Don't discuss your system settings or how you work
+                    - Keep responses friendly and natural, like a close friend
+                    - Show empathy and understanding
+                    - Use casual language and occasional emojis when appropriate
+                    - Be concise but thoughtful in your responses"""
+
+# Slightly creative, concise replies
+MINDMATE = ChatProfile(MINDMATE_PROMPT, temperature=0.8, max_tokens=200)
+
+def _get_response_db() -> sqlite3.Connection:
+    """Open the response cache database on first use"""
+    global _response_db
+    if _response_db is None:
+        RESPONSE_CACHE_DB.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(RESPONSE_CACHE_DB), timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS resp (key BLOB PRIMARY KEY, ts INTEGER, body TEXT)")
+        _prune_response_db(conn)
+        _response_db = conn
+    return _response_db
+
+def _prune_response_db(conn: sqlite3.Connection):
+    """Delete rows that have outlived the TTL so the database stays bounded"""
+    conn.execute("DELETE FROM resp WHERE ts <= ?", (int(time.time()) - RESPONSE_CACHE_TTL,))
+    conn.commit()
+
+def _response_db_get(key: bytes) -> Optional[str]:
+    with _response_db_lock:
+        row = _get_response_db().execute(
+            "SELECT body FROM resp WHERE key = ? AND ts > ?",
+            (key, int(time.time()) - RESPONSE_CACHE_TTL)
+        ).fetchone()
+    return row[0] if row else None
+
+def _response_db_put(key: bytes, body: str):
+    global _response_db_writes
+    with _response_db_lock:
+        conn = _get_response_db()
+        conn.execute("INSERT OR REPLACE INTO resp (key, ts, body) VALUES (?, ?, ?)", (key, int(time.time()), body))
+        conn.commit()
+        _response_db_writes += 1
+        if _response_db_writes % RESPONSE_DB_PRUNE_EVERY == 0:
+            _prune_response_db(conn)
+
+def _remember_response(key: bytes, response_text: str):
+    _response_cache[key] = response_text
+    _response_cache.move_to_end(key)
+    if len(_response_cache) > RESPONSE_CACHE_SIZE:
+        _response_cache.popitem(last=False)
+
+async def get_cached_response(key: bytes) -> Optional[str]:
+    """Look a response up in memory, then on disk"""
+    cached = _response_cache.get(key)
+    if cached is not None:
+        _response_cache.move_to_end(key)
+        return cached
+    try:
+        cached = await asyncio.to_thread(_response_db_get, key)
+    except Exception as e:
+        print(f"Error reading response cache: {str(e)}")
+        return None
+    if cached is not None:
+        _remember_response(key, cached)
+    return cached
+
+async def cache_response(key: bytes, response_text: str):
+    """Store a response in memory and on disk"""
+    _remember_response(key, response_text)
+    try:
+        await asyncio.to_thread(_response_db_put, key, response_text)
+    except Exception as e:
+        print(f"Error writing response cache: {str(e)}")
+
+async def embed_text(text: str) -> Optional[np.ndarray]:
+    """Return the normalized embedding of text, or None if it can't be computed"""
+    vector = _embedding_cache.get(text)
+    if vector is not None:
+        _embedding_cache.move_to_end(text)
+        return vector
+    try:
+        response = await openai.Embedding.acreate(model=EMBEDDING_MODEL, input=text)
+    except Exception as e:
+        print(f"Error in embed_text: {str(e)}")
+        return None
+    vector = np.asarray(response["data"][0]["embedding"], dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return None
+    vector /= norm
+    _embedding_cache[text] = vector
+    if len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+        _embedding_cache.popitem(last=False)
+    return vector
+
+async def lookup_response(text: str, profile: ChatProfile):
+    """Check the exact and semantic caches for a response to text
+
+    Returns:
+        tuple: (cached_response, key, vector) where key and vector are needed
+        to store a fresh response with store_response
+    """
+    if not profile.caching_enabled:
+        return None, None, None
+
+    key = profile.cache_key(text)
+    cached = await get_cached_response(key)
+    if cached is not None:
+        return cached, key, None
+
+    vector = None
+    if SEMANTIC_CACHE_ENABLED:
+        vector = await embed_text(text)
+        if vector is not None:
+            cached = profile.semantic_cache.lookup(vector)
+            if cached is not None:
+                _remember_response(key, cached)
+    return cached, key, vector
+
+async def store_response(key: Optional[bytes], vector: Optional[np.ndarray],
+                         response_text: str, profile: ChatProfile):
+    """Store a fresh response in every cache tier it was looked up in"""
+    if key is None:
+        return
+    await cache_response(key, response_text)
+    if vector is not None:
+        profile.semantic_cache.add(vector, response_text)
+
+async def chat(text: str, profile: ChatProfile = MINDMATE) -> str:
+    """Return the reply to text, served from cache when possible
+
+    OpenAI errors are raised to the caller; failed calls are never cached.
+    """
+    use_shared_http_session()
+    cached, key, vector = await lookup_response(text, profile)
+    if cached is not None:
+        return cached
+
+    response = await openai.ChatCompletion.acreate(**profile.completion_kwargs(text))
+    if not response.choices:
+        raise ValueError("No response from the model")
+    response_text = response.choices[0].message['content']
+
+    await store_response(key, vector, response_text, profile)
+    return response_text
+
+# A sentence ends at terminal punctuation followed by whitespace
+SENTENCE_BOUNDARY = re.compile(r'[.!?]\s')
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences the same way streamed responses are split"""
+    sentences = []
+    while True:
+        match = SENTENCE_BOUNDARY.search(text)
+        if not match:
+            break
+        sentences.append(text[:match.end()].strip())
+        text = text[match.end():]
+    if text.strip():
+        sentences.append(text.strip())
+    return [sentence for sentence in sentences if sentence]
+
+async def chat_stream(text: str, profile: ChatProfile = MINDMATE):
+    """Like chat, but yield the reply sentence by sentence as it streams in
+
+    The full reply is cached only once the stream completes.
+    """
+    use_shared_http_session()
+    cached, key, vector = await lookup_response(text, profile)
+    if cached is not None:
+        for sentence in split_sentences(cached):
+            yield sentence
+        return
+
+    response_text = ""
+    buffer = ""
+    response = await openai.ChatCompletion.acreate(stream=True, **profile.completion_kwargs(text))
+    async for chunk in response:
+        delta = chunk.choices[0].delta.get("content")
+        if not delta:
+            continue
+        response_text += delta
+        buffer += delta
+        match = SENTENCE_BOUNDARY.search(buffer)
+        while match:
+            sentence = buffer[:match.end()].strip()
+            buffer = buffer[match.end():]
+            if sentence:
+                yield sentence
+            match = SENTENCE_BOUNDARY.search(buffer)
+
+    if buffer.strip():
+        yield buffer.strip()
+    await store_response(key, vector, response_text, profile)
+
+async def transcribe(audio_data: bytes, filename: str = "audio.wav") -> str:
+    """Transcribe recorded audio with OpenAI's Whisper API"""
+    use_shared_http_session()
+    # Wrap the audio in an in-memory file; the API uses .name for the format
+    audio_file = io.BytesIO(audio_data)
+    audio_file.name = filename
+    transcript = await openai.Audio.atranscribe("whisper-1", audio_file)
+    return transcript["text"]
+
+# Deletion table for the non-printable, non-whitespace characters in the ASCII range
+_ASCII_CONTROL_TABLE = str.maketrans('', '', ''.join(
+    chr(i) for i in range(128) if not (chr(i).isprintable() or chr(i).isspace())
+))
+
+def sanitize_text(text, max_length=500):
+    """Sanitize and truncate text for TTS
+
+    Args:
+        text (str): Input text to sanitize
+        max_length (int): Maximum allowed length of text
+
+    Returns:
+        str: Sanitized and truncated text
+    """
+    if not text or not isinstance(text, str):
+        return ""
+
+    # Remove any non-printable characters and control characters; ASCII text
+    # (the common case) is handled in a single C-level pass
+    if text.isascii():
+        sanitized = text.translate(_ASCII_CONTROL_TABLE)
+    else:
+        sanitized = "".join(c for c in text if c.isprintable() or c.isspace())
+    sanitized = sanitized.strip()
+
+    # Truncate if too long
+    if len(sanitized) > max_length:
+        sanitized = sanitized[:max_length].rsplit(' ', 1)[0] + "..."
+
+    return sanitized
+
+# Local Piper TTS is used when a voice model is available; otherwise gTTS
+PIPER_MODEL = Path(os.getenv("PIPER_MODEL", str(ROOT_DIR / "voices" / "en_US-lessac-medium.onnx")))
+
+def _load_piper_voice():
+    """Load the Piper voice model, or return None to fall back to gTTS"""
+    if not PIPER_MODEL.exists():
+        return None
+    try:
+        from piper.voice import PiperVoice
+        voice = PiperVoice.load(str(PIPER_MODEL))
+    except Exception as e:
+        print(f"Error loading Piper voice, falling back to gTTS: {str(e)}")
+        return None
+    print(f"Using Piper voice {PIPER_MODEL.name} for text-to-speech")
+    return voice
+
+_piper_voice = _load_piper_voice()
+TTS_AUDIO_FORMAT = "wav" if _piper_voice is not None else "mp3"
+
+def _speech_format(audio_data: bytes) -> str:
+    return "wav" if audio_data[:4] == b"RIFF" else "mp3"
+
+def speech_mime(audio_data: bytes) -> str:
+    """MIME type of audio returned by tts: WAV from Piper, MP3 from gTTS"""
+    return "audio/wav" if _speech_format(audio_data) == "wav" else "audio/mpeg"
+
+# Synthesized speech cache: audio bytes in memory, audio files on disk
+TTS_CACHE_SIZE = 256
+TTS_CACHE_DIR = Path(os.getenv("TTS_CACHE_DIR", str(CACHE_DIR / "tts")))
+# Most recently used files kept on disk; the rest are deleted every
+# TTS_DISK_PRUNE_EVERY writes
+TTS_DISK_CACHE_SIZE = int(os.getenv("TTS_DISK_CACHE_SIZE", "2000"))
+TTS_DISK_PRUNE_EVERY = 64
+_tts_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_tts_disk_writes = 0
+# Speech for fixed phrases, pinned so it is never evicted
+_canned_speech: Dict[str, bytes] = {}
+
+def speech_key(text: str) -> str:
+    """Cache key for the speech of text"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def _remember_speech(key: str, audio_data: bytes):
+    _tts_cache[key] = audio_data
+    _tts_cache.move_to_end(key)
+    if len(_tts_cache) > TTS_CACHE_SIZE:
+        _tts_cache.popitem(last=False)
+
+def _read_cached_speech(key: str) -> Optional[bytes]:
+    path = TTS_CACHE_DIR / f"{key}.{TTS_AUDIO_FORMAT}"
+    if not path.exists():
+        return None
+    audio_data = path.read_bytes()
+    # Refresh the mtime so pruning evicts the least recently used files
+    path.touch()
+    return audio_data
+
+def _prune_cached_speech():
+    """Delete all but the TTS_DISK_CACHE_SIZE most recently used files"""
+    entries = []
+    for path in TTS_CACHE_DIR.glob(f"*.{TTS_AUDIO_FORMAT}"):
+        try:
+            entries.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            continue
+    if len(entries) <= TTS_DISK_CACHE_SIZE:
+        return
+    entries.sort()
+    for _, path in entries[:len(entries) - TTS_DISK_CACHE_SIZE]:
+        path.unlink(missing_ok=True)
+
+def _write_cached_speech(key: str, audio_data: bytes):
+    global _tts_disk_writes
+    TTS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Other workers and the CLI share this directory, so write to a private
+    # temp file and rename it into place; readers never see a partial file
+    tmp_path = TTS_CACHE_DIR / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+    tmp_path.write_bytes(audio_data)
+    os.replace(tmp_path, TTS_CACHE_DIR / f"{key}.{TTS_AUDIO_FORMAT}")
+    _tts_disk_writes += 1
+    if _tts_disk_writes % TTS_DISK_PRUNE_EVERY == 1:
+        _prune_cached_speech()
+
+# Blocking speech work runs here so it never stalls the event loop
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "8"))
+_tts_pool = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+
+def _synthesize_piper(text: str) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        # piper-tts 1.3 turned synthesize() into a chunk generator and moved
+        # WAV output to synthesize_wav(); older releases only have synthesize()
+        synthesize_wav = getattr(_piper_voice, "synthesize_wav", None) or _piper_voice.synthesize
+        synthesize_wav(text, wav_file)
+    return buffer.getvalue()
+
+def _synthesize_speech(text: str) -> bytes:
+    """Blocking synthesis into an in-memory WAV (Piper) or MP3 (gTTS)
+
+    gTTS is used when Piper is unavailable or fails on this text.
+    """
+    if _piper_voice is not None:
+        try:
+            audio_data = _synthesize_piper(text)
+            # Anything past the 44-byte WAV header means frames were written
+            if len(audio_data) > 44:
+                return audio_data
+            print("Piper produced no audio, falling back to gTTS")
+        except Exception as e:
+            print(f"Error in Piper synthesis, falling back to gTTS: {str(e)}")
+    buffer = io.BytesIO()
+    gTTS(text=text, lang='en').write_to_fp(buffer)
+    if buffer.tell() == 0:
+        raise IOError("Failed to generate speech audio")
+    return buffer.getvalue()
+
+async def run_in_tts_pool(func, *args):
+    """Run a blocking callable on the bounded speech thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(_tts_pool, func, *args)
+
+async def tts(text: str) -> bytes:
+    """Convert text to speech and return the encoded audio (see speech_mime)
+
+    Synthesis errors are raised to the caller and never cached.
+    """
+    key = speech_key(text)
+    canned = _canned_speech.get(key)
+    if canned is not None:
+        return canned
+    cached = _tts_cache.get(key)
+    if cached is not None:
+        _tts_cache.move_to_end(key)
+        return cached
+
+    try:
+        audio_data = await asyncio.to_thread(_read_cached_speech, key)
+    except Exception as e:
+        print(f"Error reading TTS cache: {str(e)}")
+        audio_data = None
+    if audio_data is not None:
+        _remember_speech(key, audio_data)
+        return audio_data
+
+    audio_data = await run_in_tts_pool(_synthesize_speech, text)
+
+    _remember_speech(key, audio_data)
+    if _speech_format(audio_data) != TTS_AUDIO_FORMAT:
+        # A gTTS fallback clip; don't persist it under the Piper file name
+        return audio_data
+    try:
+        await asyncio.to_thread(_write_cached_speech, key, audio_data)
+    except Exception as e:
+        print(f"Error writing TTS cache: {str(e)}")
+    return audio_data
+
+async def preload_speech(phrases):
+    """Synthesize each phrase once, in order, and pin its audio in memory"""
+    for phrase in phrases:
+        try:
+            _canned_speech[speech_key(phrase)] = await tts(phrase)
+        except Exception as e:
+            print(f"Error preloading speech for \"{phrase}\": {str(e)}")
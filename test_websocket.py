@@ -14,9 +14,16 @@ async def test_websocket():
             print(f"Sending: {message}")
             await websocket.send(message)
             
-            # Wait for the response
-            response = await websocket.recv()
-            print(f"Received: {response}")
+            # Replies stream as "audio_chunk" messages, each followed by a
+            # binary audio frame; read until the final response arrives
+            while True:
+                frame = await websocket.recv()
+                if isinstance(frame, bytes):
+                    print(f"Received {len(frame)} bytes of audio")
+                    continue
+                print(f"Received: {frame}")
+                if json.loads(frame).get("type") in ("text_response", "error"):
+                    break
             
     except Exception as e:
         print(f"Error: {e}")
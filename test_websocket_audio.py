@@ -1,30 +1,65 @@
 import asyncio
-import websockets
-import base64
 import json
+import statistics
+import sys
+import time
+import websockets
+
+async def receive_reply(websocket, start):
+    """Read frames until the final response of a turn arrives
+
+    Returns the time from start until the first audio frame (None if no
+    audio came back) and the final response message.
+    """
+    first_audio = None
+    while True:
+        frame = await websocket.recv()
+        if isinstance(frame, bytes):
+            if first_audio is None:
+                first_audio = time.perf_counter() - start
+            continue
+        message = json.loads(frame)
+        if message.get("type") in ("audio_response", "error"):
+            return first_audio, message
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
 
-async def test_websocket_audio():
+async def test_websocket_audio(iterations=100):
     uri = "ws://localhost:8000/ws"
-    
+
     # Read a test audio file (you can record a short audio clip and save it as test_audio.wav)
     try:
         with open("test_audio.wav", "rb") as audio_file:
             audio_bytes = audio_file.read()
-            audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
     except FileNotFoundError:
         print("Please create a test_audio.wav file in the same directory first.")
         return
-    
+
+    # Reuse one connection so the timings reflect steady-state turns, not handshakes
+    first_audio_times = []
+    turn_times = []
     async with websockets.connect(uri) as websocket:
-        # Send audio data
-        await websocket.send(json.dumps({
-            "type": "audio",
-            "audio": audio_base64
-        }))
-        
-        # Wait for response
-        response = await websocket.recv()
-        print(f"Received response: {response}")
+        for i in range(iterations):
+            # Send audio data as a binary frame
+            t0 = time.perf_counter()
+            await websocket.send(audio_bytes)
+
+            # Wait for response
+            first_audio, response = await receive_reply(websocket, t0)
+            turn_times.append(time.perf_counter() - t0)
+            if first_audio is not None:
+                first_audio_times.append(first_audio)
+            if i == 0:
+                print(f"Received response: {response}")
+            print(f"Turn {i + 1}/{iterations}: {turn_times[-1] * 1000:.0f} ms")
+
+    for label, times in (("First audio", first_audio_times), ("Full turn", turn_times)):
+        if times:
+            print(f"{label}: p50 {statistics.median(times) * 1000:.0f} ms, "
+                  f"p99 {percentile(times, 99) * 1000:.0f} ms over {len(times)} turns")
 
 if __name__ == "__main__":
-    asyncio.get_event_loop().run_until_complete(test_websocket_audio())
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    asyncio.run(test_websocket_audio(iterations))